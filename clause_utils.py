@@ -0,0 +1,23 @@
+import numpy as np
+
+# 批量比较共用的去重与匹配规则
+
+def dedup(items):
+    """去重，返回唯一值列表及每个元素在其中的下标"""
+    index = {}
+    inverse = [index.setdefault(x, len(index)) for x in items]
+    return list(index), np.array(inverse, dtype=np.intp)
+
+def dedup_pair(items_a, items_b, symmetric):
+    """对两组文本分别去重，对称时两组共用同一结果"""
+    uniq_a, inv_a = dedup(items_a)
+    uniq_b, inv_b = (uniq_a, inv_a) if symmetric else dedup(items_b)
+    return uniq_a, inv_a, uniq_b, inv_b
+
+def apply_match_rules(weighted, uniq_a, inv_a, uniq_b, inv_b, clean_a, clean_b):
+    """与 is_consistent 保持一致：标点差异记 0.99，完全匹配记 1.0（原地修改 weighted）"""
+    punct_eq = np.array(uniq_a, dtype=object)[:, None] == np.array(uniq_b, dtype=object)[None, :]
+    exact_eq = np.array(clean_a, dtype=object)[:, None] == np.array(clean_b, dtype=object)[None, :]
+    weighted[punct_eq[np.ix_(inv_a, inv_b)]] = 0.99
+    weighted[exact_eq] = 1.0
+    return weighted
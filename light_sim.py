@@ -1,13 +1,88 @@
-import jieba
-from difflib import SequenceMatcher
-from collections import Counter
+# 优先使用C扩展实现的jieba_fast，接口与jieba一致
+try:
+    import jieba_fast as jieba
+except ImportError:
+    import jieba
+import numpy as np
+from scipy import sparse
+from numba import njit, prange
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Indel
 import re
+from collections import Counter
+from functools import lru_cache
+from itertools import product
+from joblib import Parallel, delayed
 from pypinyin import lazy_pinyin
+from clause_utils import dedup_pair, apply_match_rules
+
+# 空白字符
+_WS_RE = re.compile(r'\s+')
+
+# 共享分词器，词典只加载一次
+tokenizer = jieba.Tokenizer()
+
+@lru_cache(maxsize=8192)
+def _jieba_tokens(text):
+    """缓存分词结果"""
+    return tuple(tokenizer.lcut(text, HMM=False))
+
+# 拼音音节 -> 编号，同音字编号相同
+_pinyin_ids = {}
+
+@lru_cache(maxsize=8192)
+def _pinyin_key(text):
+    """缓存拼音编号序列；整句转换以保留多音字的词语读音，非汉字逐字保留，每个字符对应一个编号"""
+    return tuple(_pinyin_ids.setdefault(p, len(_pinyin_ids))
+                 for p in lazy_pinyin(text, errors=list))
+
+@njit(parallel=True, cache=True)
+def _wordbag_sim_matrix(indptr_a, indices_a, data_a, indptr_b, indices_b, data_b, symmetric):
+    """
+    词袋相似度矩阵：词频交集之和 / 较大的总词频
+    
+    输入为两组 CSR 词频矩阵（列下标有序），只对非零项做归并求交；
+    symmetric 时只算上三角并镜像
+    """
+    m, n = len(indptr_a) - 1, len(indptr_b) - 1
+    sums_a = np.zeros(m, dtype=np.int64)
+    sums_b = np.zeros(n, dtype=np.int64)
+    for i in range(m):
+        sums_a[i] = data_a[indptr_a[i]:indptr_a[i + 1]].sum()
+    for j in range(n):
+        sums_b[j] = data_b[indptr_b[j]:indptr_b[j + 1]].sum()
+
+    out = np.zeros((m, n), dtype=np.float32)
+    for i in prange(m):
+        for j in range(i if symmetric else 0, n):
+            denominator = max(sums_a[i], sums_b[j])
+            if denominator == 0:
+                continue
+            numerator = 0
+            p, p_end = indptr_a[i], indptr_a[i + 1]
+            q, q_end = indptr_b[j], indptr_b[j + 1]
+            while p < p_end and q < q_end:
+                if indices_a[p] == indices_b[q]:
+                    numerator += min(data_a[p], data_b[q])
+                    p += 1
+                    q += 1
+                elif indices_a[p] < indices_b[q]:
+                    p += 1
+                else:
+                    q += 1
+            out[i, j] = numerator / denominator
+            if symmetric:
+                out[j, i] = out[i, j]
+    return out
 
 class LightweightClauseComparator:
     def __init__(self):
+        # 预加载分词词典，避免首次比较时的加载延迟
+        tokenizer.initialize()
+
         # 定义需要忽略的标点符号
         self.punctuation = '，。！？；：""''（）【】《》、'
+        self._punct_re = re.compile(f'[{re.escape(self.punctuation)}]')
         
         # 停用词列表
         self.stopwords = set(['的', '了', '且', '与', '和', '或', '由', '从', '到', '对', '该', '此'])
@@ -20,10 +95,15 @@ class LightweightClauseComparator:
             '陆': '6', '柒': '7', '捌': '8', '玖': '9', '拾': '10'
         }
 
+    def __setstate__(self, state):
+        # 子进程反序列化时预加载分词词典
+        self.__dict__.update(state)
+        tokenizer.initialize()
+
     def preprocess(self, text):
         """文本预处理"""
         # 移除空白字符
-        text = re.sub(r'\s+', '', text)
+        text = _WS_RE.sub('', text)
         
         # 标准化数字表示
         for cn_num, arab_num in self.number_map.items():
@@ -34,15 +114,20 @@ class LightweightClauseComparator:
         
         return text
 
+    def normalize(self, text):
+        """预处理并去除标点，返回 (clean, clean_no_punct)"""
+        clean = self.preprocess(text)
+        return clean, self.remove_punctuation(clean)
+
     def remove_punctuation(self, text):
         """移除标点符号"""
-        return ''.join(char for char in text if char not in self.punctuation)
+        return self._punct_re.sub('', text)
 
     def get_words_similarity(self, text1, text2):
         """计算分词后的词袋相似度"""
         # 分词
-        words1 = [w for w in jieba.cut(text1) if w not in self.stopwords]
-        words2 = [w for w in jieba.cut(text2) if w not in self.stopwords]
+        words1 = [w for w in _jieba_tokens(text1) if w not in self.stopwords]
+        words2 = [w for w in _jieba_tokens(text2) if w not in self.stopwords]
         
         # 构建词频向量
         counter1 = Counter(words1)
@@ -60,33 +145,66 @@ class LightweightClauseComparator:
         
         return numerator / denominator
 
+    def _count_csr(self, texts):
+        """分词并构建共享词表下的稀疏词频矩阵（CSR，每行一个文本，列下标有序）"""
+        vocab = {}
+        rows = []
+        for text in texts:
+            words = [w for w in _jieba_tokens(text) if w not in self.stopwords]
+            rows.append([vocab.setdefault(w, len(vocab)) for w in words])
+
+        indptr = np.cumsum([0] + [len(r) for r in rows])
+        indices = np.fromiter((i for r in rows for i in r), dtype=np.int32, count=indptr[-1])
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int16), indices, indptr),
+            shape=(len(rows), len(vocab)))
+        counts.sum_duplicates()
+        return counts
+
     def get_char_similarity(self, text1, text2):
         """计算字符级别相似度"""
-        return SequenceMatcher(None, text1, text2).ratio()
+        return fuzz.ratio(text1, text2) / 100.0
 
     def get_pinyin_similarity(self, text1, text2):
         """计算拼音相似度"""
-        pinyin1 = lazy_pinyin(text1)
-        pinyin2 = lazy_pinyin(text2)
-        return SequenceMatcher(None, pinyin1, pinyin2).ratio()
+        pinyin1 = _pinyin_key(text1)
+        pinyin2 = _pinyin_key(text2)
+        return Indel.normalized_similarity(pinyin1, pinyin2)
+
+    def _upper_bound(self, text1, text2):
+        """字符及拼音相似度上限：ratio 不超过 2*min_len/(len1+len2)（拼音序列与文本等长）"""
+        total = len(text1) + len(text2)
+        return 2 * min(len(text1), len(text2)) / total if total else 1.0
 
     def is_consistent(self, clause_a, clause_b, threshold=0.9):
-        """判断两个条款是否一致"""
+        """
+        判断两个条款是否一致，返回 (是否一致, 相似度, 详情)
+        
+        长度预筛选未通过时各维度相似度不再计算，返回的第二项固定为 0.0（不是实际相似度），
+        详情中带有"提前结束"标记及综合相似度上限
+        """
         # 预处理
-        clean_a = self.preprocess(clause_a)
-        clean_b = self.preprocess(clause_b)
+        clean_a, clean_a_no_punct = self.normalize(clause_a)
+        clean_b, clean_b_no_punct = self.normalize(clause_b)
         
         # 1. 完全相同判断
         if clean_a == clean_b:
             return True, 1.0, "完全匹配"
         
         # 2. 去除标点符号后判断
-        clean_a_no_punct = self.remove_punctuation(clean_a)
-        clean_b_no_punct = self.remove_punctuation(clean_b)
-        
         if clean_a_no_punct == clean_b_no_punct:
             return True, 0.99, "仅标点符号差异"
         
+        # 长度预筛选：即使词袋完全相同、字符和拼音达到长度上限也达不到阈值时直接返回
+        length_upper = self._upper_bound(clean_a_no_punct, clean_b_no_punct)
+        upper_sim = 0.5 + length_upper * (0.3 + 0.2)
+        if upper_sim < threshold:
+            details = {
+                "提前结束": "长度差异过大",
+                "综合相似度上限": f"{upper_sim:.3f}"
+            }
+            return False, 0.0, details
+        
         # 3. 多维度相似度计算
         words_sim = self.get_words_similarity(clean_a_no_punct, clean_b_no_punct)
         char_sim = self.get_char_similarity(clean_a_no_punct, clean_b_no_punct)
@@ -111,6 +229,61 @@ class LightweightClauseComparator:
         else:
             return False, weighted_sim, details
 
+    def get_words_similarity_matrix(self, texts_a, texts_b=None):
+        """批量计算词袋相似度矩阵，texts_b 为空时计算 texts_a 自身的对称矩阵"""
+        symmetric = texts_b is None or texts_b is texts_a
+        if symmetric:
+            counts_a = counts_b = self._count_csr(texts_a)
+        else:
+            counts = self._count_csr(list(texts_a) + list(texts_b))
+            counts_a = counts[:len(texts_a)]
+            counts_b = counts[len(texts_a):]
+        return _wordbag_sim_matrix(
+            counts_a.indptr, counts_a.indices, counts_a.data,
+            counts_b.indptr, counts_b.indices, counts_b.data, symmetric)
+
+    def compare_matrix(self, list_a, list_b=None):
+        """批量计算两组条款之间的综合相似度矩阵（float32），list_b 为空时计算 list_a 自身的对称矩阵"""
+        symmetric = list_b is None or list_b is list_a
+
+        # 预处理
+        normalized_a = [self.normalize(x) for x in list_a]
+        clean_a = [clean for clean, _ in normalized_a]
+        no_punct_a = [no_punct for _, no_punct in normalized_a]
+        if symmetric:
+            clean_b, no_punct_b = clean_a, no_punct_a
+        else:
+            normalized_b = [self.normalize(x) for x in list_b]
+            clean_b = [clean for clean, _ in normalized_b]
+            no_punct_b = [no_punct for _, no_punct in normalized_b]
+
+        # 仅对去标点后不同的文本计算相似度，再映射回原始下标
+        uniq_a, inv_a, uniq_b, inv_b = dedup_pair(no_punct_a, no_punct_b, symmetric)
+        pinyin_a = [_pinyin_key(x) for x in uniq_a]
+        pinyin_b = pinyin_a if symmetric else [_pinyin_key(x) for x in uniq_b]
+
+        # 多维度相似度矩阵；对称时查询与候选为同一对象，rapidfuzz 只计算一半
+        words_m = self.get_words_similarity_matrix(uniq_a, uniq_b)
+        char_m = process.cdist(
+            uniq_a, uniq_b, scorer=fuzz.ratio, dtype=np.float32, workers=-1) / np.float32(100.0)
+        pinyin_m = process.cdist(
+            pinyin_a, pinyin_b,
+            scorer=Indel.normalized_similarity, dtype=np.float32, workers=-1)
+
+        weighted = (words_m * 0.5 + char_m * 0.3 + pinyin_m * 0.2).astype(np.float32)
+        weighted = weighted[np.ix_(inv_a, inv_b)]
+
+        # 与 is_consistent 保持一致的完全匹配和标点差异判断
+        return apply_match_rules(weighted, uniq_a, inv_a, uniq_b, inv_b, clean_a, clean_b)
+
+    def compare_all(self, clauses_a, clauses_b, threshold=0.9, n_jobs=-1):
+        """多进程逐对判断两组条款的一致性，返回 is_consistent 结果的二维列表"""
+        results = Parallel(n_jobs=n_jobs, backend='loky', batch_size=100)(
+            delayed(self.is_consistent)(a, b, threshold)
+            for a, b in product(clauses_a, clauses_b))
+        n = len(clauses_b)
+        return [results[i:i + n] for i in range(0, len(results), n)] if n else [[] for _ in clauses_a]
+
 # 使用示例
 def main():
     comparator = LightweightClauseComparator()
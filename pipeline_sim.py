@@ -1,51 +1,116 @@
 import jieba
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from difflib import SequenceMatcher
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Indel
 import re
+import hashlib
+import diskcache
 from pypinyin import lazy_pinyin
+from clause_utils import dedup_pair, apply_match_rules
+
+# 空白字符
+_WS_RE = re.compile(r'\s+')
+
+# 嵌入int8线性量化的缩放系数
+_QSCALE = 127.0
+
+# 磁盘缓存中嵌入的存储格式，格式或缩放系数变化时缓存键随之变化
+_CACHE_FORMAT = f'int8-{int(_QSCALE)}'
+
+def _quantize(vectors):
+    """将归一化嵌入量化为int8"""
+    return np.clip(np.round(vectors * _QSCALE), -127, 127).astype(np.int8)
 
 class ClauseComparator:
-    def __init__(self):
+    def __init__(self, model_name='paraphrase-multilingual-MiniLM-L12-v2', cache_dir='.emb_cache'):
         # 加载中文BERT模型
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        # GPU上以半精度推理；CPU的fp16矩阵运算反而更慢，保持fp32
+        if self.model.device.type == 'cuda':
+            self.model.half()
         
         # 定义需要忽略的标点符号
         self.punctuation = '，。！？；：""''（）【】《》、'
+        self._punct_re = re.compile(f'[{re.escape(self.punctuation)}]')
         
         # 停用词列表
         self.stopwords = set(['的', '了', '且', '与', '和', '或', '由', '从', '到', '对', '该', '此'])
 
+        # 文本嵌入缓存（内存 + 磁盘，int8存储），cache_dir 为 None 时不做持久化
+        self.embeddings = {}
+        self.cache = diskcache.Cache(cache_dir) if cache_dir else None
+
     def preprocess(self, text):
         """预处理文本"""
-        # 统一全角转半角、简体转繁体等
-        text = text.strip()
-        text = ''.join(char.strip() for char in text if char.strip())
-        # 移除多余空白字符
-        text = re.sub(r'\s+', '', text)
-        return text
+        # 移除所有空白字符
+        return _WS_RE.sub('', text)
 
     def remove_punctuation(self, text):
         """移除标点符号"""
-        return ''.join(char for char in text if char not in self.punctuation)
+        return self._punct_re.sub('', text)
+
+    def _cache_key(self, text):
+        """磁盘缓存键：(模型名, 存储格式, 文本sha1)"""
+        return (self.model_name, _CACHE_FORMAT, hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+    def encode_all(self, texts):
+        """批量计算文本嵌入，每个文本只编码一次"""
+        missing = list({t for t in texts if t not in self.embeddings})
+
+        # 先从磁盘缓存读取
+        if missing and self.cache is not None:
+            uncached = []
+            for t in missing:
+                vector = self.cache.get(self._cache_key(t))
+                if vector is None:
+                    uncached.append(t)
+                else:
+                    self.embeddings[t] = vector
+            missing = uncached
+
+        if missing:
+            # 按长度排序，减少同批次内的填充
+            missing.sort(key=len)
+            vectors = _quantize(self.model.encode(
+                missing, batch_size=64, convert_to_numpy=True,
+                normalize_embeddings=True, show_progress_bar=False).astype(np.float32))
+            self.embeddings.update(zip(missing, vectors))
+
+            # 写回磁盘缓存
+            if self.cache is not None:
+                for t, vector in zip(missing, vectors):
+                    self.cache.set(self._cache_key(t), vector)
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.int8)
+        return np.stack([self.embeddings[t] for t in texts])
 
     def get_semantic_similarity(self, text1, text2):
         """计算语义相似度"""
-        # 使用BERT模型获取文本嵌入
-        embeddings = self.model.encode([text1, text2])
-        similarity = np.dot(embeddings[0], embeddings[1]) / (
-            np.linalg.norm(embeddings[0]) * np.linalg.norm(embeddings[1]))
-        return similarity
+        return float(self.get_semantic_similarity_matrix([text1], [text2])[0, 0])
+
+    def get_semantic_similarity_matrix(self, texts_a, texts_b=None):
+        """批量计算语义相似度矩阵，texts_b 为空时计算 texts_a 自身的相似度矩阵"""
+        # 嵌入已归一化，内积即余弦相似度；int8编码转fp32后直接走BLAS。
+        # 维度不超过1040时乘积之和在fp32下精确（dim*127^2 < 2^24），更高维度仅有fp32舍入误差
+        emb_a = self.encode_all(texts_a).astype(np.float32)
+        if texts_b is None or texts_b is texts_a:
+            emb_b = emb_a
+        else:
+            emb_b = self.encode_all(texts_b).astype(np.float32)
+        return (emb_a @ emb_b.T) / np.float32(_QSCALE * _QSCALE)
 
     def get_char_similarity(self, text1, text2):
         """计算字符级别相似度"""
-        return SequenceMatcher(None, text1, text2).ratio()
+        return fuzz.ratio(text1, text2) / 100.0
 
     def get_pinyin_similarity(self, text1, text2):
         """计算拼音相似度，处理同音字"""
-        pinyin1 = ' '.join(lazy_pinyin(text1))
-        pinyin2 = ' '.join(lazy_pinyin(text2))
-        return SequenceMatcher(None, pinyin1, pinyin2).ratio()
+        # 按音节逐个比较，而不是拼接后逐字符比较
+        pinyin1 = tuple(lazy_pinyin(text1))
+        pinyin2 = tuple(lazy_pinyin(text2))
+        return Indel.normalized_similarity(pinyin1, pinyin2)
 
     def is_consistent(self, clause_a, clause_b, threshold=0.9):
         """判断两个条款是否一致"""
@@ -83,6 +148,39 @@ class ClauseComparator:
             reason = f"相似度不足: {weighted_sim:.3f}"
             return False, weighted_sim, reason
 
+    def compare_matrix(self, list_a, list_b=None):
+        """批量计算两组条款之间的综合相似度矩阵（float32），list_b 为空时计算 list_a 自身的对称矩阵"""
+        symmetric = list_b is None or list_b is list_a
+
+        # 预处理
+        clean_a = [self.preprocess(x) for x in list_a]
+        no_punct_a = [self.remove_punctuation(x) for x in clean_a]
+        if symmetric:
+            clean_b, no_punct_b = clean_a, no_punct_a
+        else:
+            clean_b = [self.preprocess(x) for x in list_b]
+            no_punct_b = [self.remove_punctuation(x) for x in clean_b]
+
+        # 语义相似度在当前进程内批量编码
+        semantic_m = self.get_semantic_similarity_matrix(clean_a, clean_b)
+
+        # 字符和拼音相似度由rapidfuzz多线程计算，仅对去标点后不同的文本计算，再映射回原始下标
+        # 对称时查询与候选为同一对象，rapidfuzz 只计算一半
+        uniq_a, inv_a, uniq_b, inv_b = dedup_pair(no_punct_a, no_punct_b, symmetric)
+        pinyin_a = [tuple(lazy_pinyin(x)) for x in uniq_a]
+        pinyin_b = pinyin_a if symmetric else [tuple(lazy_pinyin(x)) for x in uniq_b]
+        char_m = process.cdist(
+            uniq_a, uniq_b, scorer=fuzz.ratio, dtype=np.float32, workers=-1) / np.float32(100.0)
+        pinyin_m = process.cdist(
+            pinyin_a, pinyin_b,
+            scorer=Indel.normalized_similarity, dtype=np.float32, workers=-1)
+        string_m = (char_m * 0.3 + pinyin_m * 0.2)[np.ix_(inv_a, inv_b)]
+
+        weighted = (semantic_m * 0.5 + string_m).astype(np.float32)
+
+        # 与 is_consistent 保持一致的完全匹配和标点差异判断
+        return apply_match_rules(weighted, uniq_a, inv_a, uniq_b, inv_b, clean_a, clean_b)
+
 # 使用示例
 def main():
     comparator = ClauseComparator()
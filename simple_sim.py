@@ -1,9 +1,19 @@
 import numpy as np
+from functools import lru_cache
+from sklearn.base import clone
 from sklearn.feature_extraction.text import TfidfVectorizer
-from difflib import SequenceMatcher
-import jieba
+from rapidfuzz import fuzz
+# 优先使用C扩展实现的jieba_fast，接口与jieba一致
+try:
+    import jieba_fast as jieba
+except ImportError:
+    import jieba
 from scipy.spatial.distance import cosine
 
+# 共享分词器，导入时预加载词典
+tokenizer = jieba.Tokenizer()
+tokenizer.initialize()
+
 # TF-IDF + 余弦相似度
 
 # 优点：考虑词频和重要性权重
@@ -24,38 +34,91 @@ from scipy.spatial.distance import cosine
 # 适用：快速对比文本相似程度
 # 特点：只考虑词的共现情况，不考虑顺序和频率
 
+@lru_cache(maxsize=8192)
+def _cut(text):
+    """分词（关闭HMM），结果按文本缓存"""
+    return tuple(tokenizer.lcut(text, HMM=False))
+
+class SimilarityCalculator:
+    """
+    复用同一个 TF-IDF 向量器的相似度计算器
+    
+    Parameters:
+    corpus: 用于拟合 TF-IDF 的代表性语料，为空时每次计算都以当批输入文本临时拟合
+    """
+    def __init__(self, corpus=None):
+        self.tfidf = TfidfVectorizer(tokenizer=_cut, token_pattern=None)
+        self.fitted = False
+        if corpus:
+            self.fit(corpus)
+
+    def fit(self, corpus):
+        """在语料上拟合 TF-IDF 向量器"""
+        self.tfidf.fit(corpus)
+        self.fitted = True
+        return self
+
+    def cosine_matrix(self, texts):
+        """
+        批量计算 TF-IDF 余弦相似度矩阵
+        
+        Parameters:
+        texts: 待比较的文本列表
+        
+        Returns:
+        np.ndarray: 两两之间的余弦相似度矩阵
+        """
+        if self.fitted:
+            X = self.tfidf.transform(texts)
+        else:
+            # 未提供语料时以当批文本临时拟合，不改变计算器自身的状态
+            X = clone(self.tfidf).fit_transform(texts)
+        return (X @ X.T).toarray()
+
+    def calculate_similarities(self, text1, text2):
+        """
+        计算两段文本之间的多种相似度指标
+        
+        Parameters:
+        text1, text2: 待比较的两段文本
+        
+        Returns:
+        dict: 包含多种相似度指标的字典
+        """
+        # 1. TF-IDF + 余弦相似度
+        cosine_sim = self.cosine_matrix([text1, text2])[0, 1]
+        
+        # 2. 编辑距离相似度(基于rapidfuzz的Indel距离)
+        sequence_sim = fuzz.ratio(text1, text2) / 100.0
+        
+        # 3. Jaccard相似度
+        set1 = set(_cut(text1))
+        set2 = set(_cut(text2))
+        jaccard = len(set1 & set2) / len(set1 | set2)
+        
+        return {
+            'cosine_similarity': cosine_sim,
+            'sequence_similarity': sequence_sim,
+            'jaccard_similarity': jaccard
+        }
+
+# 未拟合语料的默认计算器，仅供兼容旧接口
+_default_calculator = SimilarityCalculator()
+
 def calculate_similarities(text1, text2):
     """
     计算两段文本之间的多种相似度指标
     
+    兼容旧接口：TF-IDF 仍在每次调用时以这两段文本拟合。
+    批量或重复比较时应使用以语料拟合过的 SimilarityCalculator。
+    
     Parameters:
     text1, text2: 待比较的两段文本
     
     Returns:
     dict: 包含多种相似度指标的字典
     """
-    # 对文本进行分词
-    text1_seg = ' '.join(jieba.cut(text1))
-    text2_seg = ' '.join(jieba.cut(text2))
-    
-    # 1. TF-IDF + 余弦相似度
-    tfidf = TfidfVectorizer()
-    tfidf_matrix = tfidf.fit_transform([text1_seg, text2_seg])
-    cosine_sim = (tfidf_matrix * tfidf_matrix.T).toarray()[0,1]
-    
-    # 2. 编辑距离相似度(基于SequenceMatcher)
-    sequence_sim = SequenceMatcher(None, text1, text2).ratio()
-    
-    # 3. Jaccard相似度
-    set1 = set(jieba.cut(text1))
-    set2 = set(jieba.cut(text2))
-    jaccard = len(set1 & set2) / len(set1 | set2)
-    
-    return {
-        'cosine_similarity': cosine_sim,
-        'sequence_similarity': sequence_sim,
-        'jaccard_similarity': jaccard
-    }
+    return _default_calculator.calculate_similarities(text1, text2)
 
 # 示例使用
 text1 = "甲方应当在合同签订后的十个工作日内支付预付款"